@@ -1,8 +1,8 @@
 import hashlib
 import json
 import logging
-import requests
 from collections import OrderedDict
+from decimal import Decimal
 from django import forms
 from django.conf import settings
 from django.contrib import messages
@@ -11,8 +11,8 @@ from django.http import HttpRequest
 from django.template.loader import get_template
 from django.utils.safestring import mark_safe
 from django.utils.translation import get_language, gettext_lazy as _
+from functools import lru_cache
 from json import JSONDecodeError
-from localflavor.generic.forms import IBANFormField
 from pretix.base.decimal import round_decimal
 from pretix.base.forms import SecretKeySettingsField
 from pretix.base.forms.questions import guess_country
@@ -22,7 +22,6 @@ from pretix.base.settings import SettingsSandbox
 from pretix.helpers.countries import CachedCountries
 from pretix.helpers.urls import build_absolute_uri as build_global_uri
 from pretix.multidomain.urlreverse import build_absolute_uri
-from requests import HTTPError, RequestException
 
 from pretix_payone.models import ReferencedPayoneObject
 
@@ -41,6 +40,29 @@ cardtypes = [
 ]
 
 
+@lru_cache(maxsize=None)
+def _tpl(path):
+    # Compiled templates are safe to share, so we do not depend on the host enabling the cached loader
+    return get_template(path)
+
+
+@lru_cache(maxsize=None)
+def _get_session():
+    # Reuse connections to the PAYONE API across payments within a worker. The session
+    # is shared by all organizers, so it must never persist cookies between calls.
+    import requests
+    from http.cookiejar import DefaultCookiePolicy
+
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+@lru_cache(maxsize=8)
+def _scale(currency):
+    return Decimal(10) ** settings.CURRENCY_PLACES.get(currency, 2)
+
+
 class PayoneSettingsHolder(BasePaymentProvider):
     identifier = "payone"
     verbose_name = "PAYONE"
@@ -185,8 +207,9 @@ class PayoneMethod(BasePaymentProvider):
 
     @property
     def is_enabled(self) -> bool:
-        return self.settings.get("_enabled", as_type=bool) and self.settings.get(
-            "method_{}".format(self.method), as_type=bool
+        return bool(
+            self.settings.get("_enabled", as_type=bool)
+            and self.settings.get("method_{}".format(self.method), as_type=bool)
         )
 
     def payment_refund_supported(self, payment: OrderPayment) -> bool:
@@ -202,7 +225,7 @@ class PayoneMethod(BasePaymentProvider):
         return True
 
     def payment_form_render(self, request) -> str:
-        template = get_template("pretix_payone/checkout_payment_form.html")
+        template = _tpl("pretix_payone/checkout_payment_form.html")
         if self.payment_form_fields:
             form = self.payment_form(request)
         else:
@@ -216,7 +239,7 @@ class PayoneMethod(BasePaymentProvider):
         return template.render(ctx)
 
     def checkout_confirm_render(self, request) -> str:
-        template = get_template("pretix_payone/checkout_payment_confirm.html")
+        template = _tpl("pretix_payone/checkout_payment_confirm.html")
         ctx = {
             "request": request,
             "event": self.event,
@@ -225,12 +248,22 @@ class PayoneMethod(BasePaymentProvider):
         }
         return template.render(ctx)
 
+    def _payment_info(self, request, payment):
+        if not payment.info:
+            return None
+        cache = getattr(request, "_payone_info_cache", None)
+        if cache is None:
+            cache = {}
+            if request is not None:
+                request._payone_info_cache = cache
+        key = (payment.pk, payment.info)
+        if key not in cache:
+            cache[key] = json.loads(payment.info)
+        return cache[key]
+
     def payment_pending_render(self, request, payment) -> str:
-        if payment.info:
-            payment_info = json.loads(payment.info)
-        else:
-            payment_info = None
-        template = get_template("pretix_payone/pending.html")
+        payment_info = self._payment_info(request, payment)
+        template = _tpl("pretix_payone/pending.html")
         ctx = {
             "request": request,
             "event": self.event,
@@ -243,11 +276,8 @@ class PayoneMethod(BasePaymentProvider):
         return template.render(ctx)
 
     def payment_control_render(self, request, payment) -> str:
-        if payment.info:
-            payment_info = json.loads(payment.info)
-        else:
-            payment_info = None
-        template = get_template("pretix_payone/control.html")
+        payment_info = self._payment_info(request, payment)
+        template = _tpl("pretix_payone/control.html")
         ctx = {
             "request": request,
             "event": self.event,
@@ -297,11 +327,15 @@ class PayoneMethod(BasePaymentProvider):
             "transaction_param": f"{self.event.slug}-{refund.full_id}",
         }
         data = dict(**refund_params, **self._default_params)
+
+        from requests import HTTPError, RequestException
+
         try:
-            req = requests.post(
+            req = _get_session().post(
                 "https://api.pay1.de/post-gateway/",
                 data=data,
                 headers={"Accept": "application/json"},
+                timeout=(5, 30),
             )
             req.raise_for_status()
         except HTTPError:
@@ -340,7 +374,7 @@ class PayoneMethod(BasePaymentProvider):
             refund.payment.info = json.dumps(d)
             refund.payment.save()
 
-        refund.info = json.dumps(data)
+        refund.info = req.text
 
         if data["Status"] == "APPROVED":
             refund.done()
@@ -352,12 +386,12 @@ class PayoneMethod(BasePaymentProvider):
             raise PaymentException(data["Error"].get("ErrorMessage", "Unknown error"))
 
     def _amount_to_decimal(self, cents):
-        places = settings.CURRENCY_PLACES.get(self.event.currency, 2)
-        return round_decimal(float(cents) / (10**places), self.event.currency)
+        return round_decimal(
+            Decimal(cents) / _scale(self.event.currency), self.event.currency
+        )
 
     def _decimal_to_int(self, amount):
-        places = settings.CURRENCY_PLACES.get(self.event.currency, 2)
-        return int(amount * 10**places)
+        return int(amount * _scale(self.event.currency))
 
     def _get_payment_params(self, request, payment):
         d = {
@@ -390,15 +424,14 @@ class PayoneMethod(BasePaymentProvider):
             d["wallettype"] = self.wallettype
 
         if self.clearingtype in ("sb", "wlt", "cc"):
+            order_hash = hashlib.sha1(payment.order.secret.lower().encode()).hexdigest()
             d["successurl"] = build_absolute_uri(
                 self.event,
                 "plugins:pretix_payone:return",
                 kwargs={
                     "order": payment.order.code,
                     "payment": payment.pk,
-                    "hash": hashlib.sha1(
-                        payment.order.secret.lower().encode()
-                    ).hexdigest(),
+                    "hash": order_hash,
                     "action": "success",
                 },
             )
@@ -408,9 +441,7 @@ class PayoneMethod(BasePaymentProvider):
                 kwargs={
                     "order": payment.order.code,
                     "payment": payment.pk,
-                    "hash": hashlib.sha1(
-                        payment.order.secret.lower().encode()
-                    ).hexdigest(),
+                    "hash": order_hash,
                     "action": "error",
                 },
             )
@@ -420,9 +451,7 @@ class PayoneMethod(BasePaymentProvider):
                 kwargs={
                     "order": payment.order.code,
                     "payment": payment.pk,
-                    "hash": hashlib.sha1(
-                        payment.order.secret.lower().encode()
-                    ).hexdigest(),
+                    "hash": order_hash,
                     "action": "cancel",
                 },
             )
@@ -435,12 +464,14 @@ class PayoneMethod(BasePaymentProvider):
         if ia.company:
             d["company"] = ia.company[:50]
 
-        if ia.name_parts.get("family_name"):
-            d["lastname"] = ia.name_parts.get("family_name", "")[:50]
-            d["firstname"] = ia.name_parts.get("given_name", "")[:50]
+        name_parts = ia.name_parts
+        if name_parts.get("family_name"):
+            d["lastname"] = name_parts["family_name"][:50]
+            d["firstname"] = name_parts.get("given_name", "")[:50]
         elif ia.name:
-            d["lastname"] = ia.name.rsplit(" ", 1)[-1][:50]
-            d["firstname"] = ia.name.rsplit(" ", 1)[0][:50]
+            name_split = ia.name.rsplit(" ", 1)
+            d["lastname"] = name_split[-1][:50]
+            d["firstname"] = name_split[0][:50]
         elif not ia.company:
             d["lastname"] = "Unknown"
 
@@ -453,10 +484,10 @@ class PayoneMethod(BasePaymentProvider):
             d["vatid"] = ia.vat_id
 
         if self.invoice_address_mandatory:
-            if ia.name_parts.get("salutation"):
-                d["salutation"] = ia.name_parts.get("salutation", "")[:10]
-            if ia.name_parts.get("title"):
-                d["title"] = ia.name_parts.get("title", "")[:20]
+            if name_parts.get("salutation"):
+                d["salutation"] = name_parts["salutation"][:10]
+            if name_parts.get("title"):
+                d["title"] = name_parts["title"][:20]
             if ia.street:
                 d["street"] = ia.street[:50]
             if ia.zipcode:
@@ -481,14 +512,17 @@ class PayoneMethod(BasePaymentProvider):
         return d
 
     def execute_payment(self, request: HttpRequest, payment: OrderPayment):
-        data = dict(
-            **self._get_payment_params(request, payment), **self._default_params
-        )
+        data = self._get_payment_params(request, payment)
+        data.update(self._default_params)
+
+        from requests import HTTPError, RequestException
+
         try:
-            req = requests.post(
+            req = _get_session().post(
                 "https://api.pay1.de/post-gateway/",
                 data=data,
                 headers={"Accept": "application/json"},
+                timeout=(5, 30),
             )
             req.raise_for_status()
         except HTTPError:
@@ -517,7 +551,7 @@ class PayoneMethod(BasePaymentProvider):
 
         data = req.json()
 
-        payment.info = json.dumps(data)
+        payment.info = req.text
         payment.state = OrderPayment.PAYMENT_STATE_CREATED
         payment.save()
 
@@ -548,21 +582,21 @@ class PayoneMethod(BasePaymentProvider):
 
     def redirect(self, request, url):
         if request.session.get("iframe_session", False):
-            return (
-                build_absolute_uri(request.event, "plugins:pretix_payone:redirect")
-                + "?data="
-                + signing.dumps(
-                    {
-                        "url": url,
-                        "session": {
-                            "payment_payone_order_secret": request.session[
-                                "payment_payone_order_secret"
-                            ],
-                        },
+            from urllib.parse import urlencode
+
+            base = build_absolute_uri(request.event, "plugins:pretix_payone:redirect")
+            data = signing.dumps(
+                {
+                    "url": url,
+                    "session": {
+                        "payment_payone_order_secret": request.session[
+                            "payment_payone_order_secret"
+                        ],
                     },
-                    salt="safe-redirect",
-                )
+                },
+                salt="safe-redirect",
             )
+            return f"{base}?{urlencode({'data': data})}"
         else:
             return str(url)
 
@@ -627,17 +661,14 @@ class PayoneCC(PayoneMethod):
             "storecarddata": "yes",
         }
 
-        h = hashlib.md5()
-        for k in sorted(d.keys()):
-            h.update(d[k].encode())
-        h.update(self.settings.key.encode())
-        d["hash"] = h.hexdigest()
+        payload = "".join(d[k] for k in sorted(d)) + self.settings.key
+        d["hash"] = hashlib.md5(payload.encode()).hexdigest()
 
         lng = get_language()[:2]
         if lng not in ("de", "en", "es", "fr", "it", "nl", "pt"):
             lng = "en"
 
-        template = get_template("pretix_payone/checkout_payment_form_cc.html")
+        template = _tpl("pretix_payone/checkout_payment_form_cc.html")
         ctx = {
             "request": request,
             "event": self.event,
@@ -670,6 +701,8 @@ class PayoneGiropay(PayoneMethod):  # untested
 
     @property
     def payment_form_fields(self):
+        from localflavor.generic.forms import IBANFormField
+
         return OrderedDict(
             [
                 (
@@ -8,9 +8,20 @@ from pretix.presale.signals import process_response
 
 logger = logging.getLogger(__name__)
 
+_PROVIDERS = None
+
+_PAYONE_CSP = {
+    src: ["https://secure.pay1.de"]
+    for src in ("frame-src", "style-src", "script-src", "img-src", "connect-src")
+}
+
 
 @receiver(register_payment_providers, dispatch_uid="payment_payone")
 def register_payment_provider(sender, **kwargs):
+    global _PROVIDERS
+    if _PROVIDERS is not None:
+        return _PROVIDERS
+
     from .payment import (
         PayoneAlipay,
         PayoneBancontact,
@@ -30,7 +41,7 @@ def register_payment_provider(sender, **kwargs):
         PayoneVerkkopankki,
     )
 
-    return [
+    _PROVIDERS = [
         PayoneCC,
         PayoneEPS,
         PayoneGiropay,
@@ -48,6 +59,7 @@ def register_payment_provider(sender, **kwargs):
         PayonePrzelewy24,
         PayoneSofort,
     ]
+    return _PROVIDERS
 
 
 @receiver(signal=logentry_display, dispatch_uid="payone_logentry_display")
@@ -62,24 +74,24 @@ def pretixcontrol_logentry_display(sender, logentry, **kwargs):
 
 @receiver(signal=process_response, dispatch_uid="payment_payone_middleware_resp")
 def signal_process_response(sender, request, response, **kwargs):
-    from .payment import PayoneSettingsHolder
+    if 300 <= response.status_code < 400:
+        return response
+    if not response.get("Content-Type", "").startswith("text/html"):
+        return response
 
-    provider = PayoneSettingsHolder(sender)
-    url = resolve(request.path_info)
+    # Read the flag directly instead of going through PayoneSettingsHolder's sandbox,
+    # this runs for every response.
+    if not sender.settings.get("payment_payone__enabled", as_type=bool):
+        return response
 
-    if provider.settings.get("_enabled", as_type=bool) and (
-        "checkout" in url.url_name or "order.pay" in url.url_name
-    ):
+    url = resolve(request.path_info)
+    if "checkout" in url.url_name or "order.pay" in url.url_name:
         if "Content-Security-Policy" in response:
             h = _parse_csp(response["Content-Security-Policy"])
         else:
             h = {}
 
-        sources = ["frame-src", "style-src", "script-src", "img-src", "connect-src"]
-
-        csps = {src: ["https://secure.pay1.de"] for src in sources}
-
-        _merge_csp(h, csps)
+        _merge_csp(h, _PAYONE_CSP)
 
         if h:
             response["Content-Security-Policy"] = _render_csp(h)
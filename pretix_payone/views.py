@@ -1,7 +1,7 @@
 import hashlib
+import hmac
 import json
 import logging
-import urllib
 from decimal import Decimal
 from django.contrib import messages
 from django.core import signing
@@ -48,7 +48,7 @@ def redirect_view(request, *args, **kwargs):
                     request.event, "plugins:pretix_payone:redirect"
                 )
                 + "?"
-                + urllib.parse.urlencode(params),
+                + params.urlencode(),
             },
         )
         r._csp_ignore = True
@@ -57,31 +57,21 @@ def redirect_view(request, *args, **kwargs):
 
 class PayoneOrderView:
     def dispatch(self, request, *args, **kwargs):
-        try:
-            self.order = request.event.orders.get(code=kwargs["order"])
-            if (
-                hashlib.sha1(self.order.secret.lower().encode()).hexdigest()
-                != kwargs["hash"].lower()
-            ):
-                raise Http404("")
-        except Order.DoesNotExist:
-            # Do a hash comparison as well to harden timing attacks
-            if (
-                "abcdefghijklmnopq".lower()
-                == hashlib.sha1("abcdefghijklmnopq".encode()).hexdigest()
-            ):
-                raise Http404("")
-            else:
-                raise Http404("")
-        return super().dispatch(request, *args, **kwargs)
-
-    @cached_property
-    def payment(self):
-        return get_object_or_404(
-            self.order.payments,
-            pk=self.kwargs["payment"],
+        self.payment = get_object_or_404(
+            OrderPayment.objects.select_related("order"),
+            order__event=request.event,
+            order__code=kwargs["order"],
+            pk=kwargs["payment"],
             provider__startswith="payone",
         )
+        self.order = self.payment.order
+        self.order.event = request.event
+        if not hmac.compare_digest(
+            hashlib.sha1(self.order.secret.lower().encode()).hexdigest().encode(),
+            kwargs["hash"].lower().encode(),
+        ):
+            raise Http404("")
+        return super().dispatch(request, *args, **kwargs)
 
     @cached_property
     def pprov(self):
@@ -156,9 +146,12 @@ class WebhookView(View):
     @scopes_disabled()
     def post(self, request, *args, **kwargs):
         try:
-            r = ReferencedPayoneObject.objects.get(txid=request.POST.get("txid"))
+            r = ReferencedPayoneObject.objects.select_related(
+                "order__event", "payment"
+            ).get(txid=request.POST.get("txid"))
         except ReferencedPayoneObject.DoesNotExist:
             return HttpResponse(status=409)
+        r.payment.order = r.order
 
         pprov = r.payment.payment_provider
         if hashlib.md5(pprov.settings.key.encode()).hexdigest() != request.POST.get(
@@ -227,11 +220,3 @@ class WebhookView(View):
                 )
 
         return HttpResponse("TSOK", status=200)
-
-    @cached_property
-    def payment(self):
-        return get_object_or_404(
-            OrderPayment.objects.filter(order__event=self.request.event),
-            pk=self.kwargs["payment"],
-            provider__startswith="payone",
-        )
@@ -1 +1,46 @@
 # put your pytest fixtures here
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.utils.timezone import now
+from django_scopes import scopes_disabled
+from pretix.base.models import Event, Order, OrderPayment, Organizer
+
+
+@pytest.fixture
+@scopes_disabled()
+def event():
+    o = Organizer.objects.create(name="Dummy", slug="dummy")
+    return Event.objects.create(
+        organizer=o,
+        name="Dummy",
+        slug="dummy",
+        date_from=now(),
+        live=True,
+        plugins="pretix_payone",
+    )
+
+
+@pytest.fixture
+@scopes_disabled()
+def order(event):
+    return Order.objects.create(
+        code="FOOBAR",
+        event=event,
+        email="dummy@dummy.test",
+        status=Order.STATUS_PENDING,
+        datetime=now(),
+        expires=now() + timedelta(days=10),
+        total=Decimal("13.37"),
+        sales_channel=event.organizer.sales_channels.get(identifier="web"),
+    )
+
+
+@pytest.fixture
+@scopes_disabled()
+def payment(order):
+    return order.payments.create(
+        provider="payone_creditcard",
+        amount=order.total,
+        state=OrderPayment.PAYMENT_STATE_CREATED,
+    )
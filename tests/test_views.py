@@ -0,0 +1,90 @@
+import hashlib
+import pytest
+from django.core import signing
+from django_scopes import scopes_disabled
+from pretix.base.models import OrderPayment
+from pretix.multidomain.urlreverse import eventreverse
+from urllib.parse import parse_qs, urlparse
+
+
+def _return_url(event, order, payment, hash, action="success"):
+    return eventreverse(
+        event,
+        "plugins:pretix_payone:return",
+        kwargs={
+            "order": order.code,
+            "payment": payment.pk,
+            "hash": hash,
+            "action": action,
+        },
+    )
+
+
+def _order_hash(order):
+    return hashlib.sha1(order.secret.lower().encode()).hexdigest()
+
+
+@pytest.mark.django_db
+def test_return_valid_hash(client, event, order, payment):
+    r = client.get(_return_url(event, order, payment, _order_hash(order)))
+    assert r.status_code == 302
+    with scopes_disabled():
+        payment.refresh_from_db()
+    assert payment.state == OrderPayment.PAYMENT_STATE_PENDING
+
+
+@pytest.mark.django_db
+def test_return_uppercase_hash(client, event, order, payment):
+    r = client.get(_return_url(event, order, payment, _order_hash(order).upper()))
+    assert r.status_code == 302
+
+
+@pytest.mark.django_db
+def test_return_invalid_hash(client, event, order, payment):
+    r = client.get(_return_url(event, order, payment, "0" * 40))
+    assert r.status_code == 404
+    with scopes_disabled():
+        payment.refresh_from_db()
+    assert payment.state == OrderPayment.PAYMENT_STATE_CREATED
+
+
+@pytest.mark.django_db
+def test_return_unknown_order(client, event, order, payment):
+    order.code = "NOPE1"
+    r = client.get(_return_url(event, order, payment, _order_hash(order)))
+    assert r.status_code == 404
+
+
+@pytest.mark.django_db
+def test_redirect_roundtrip(client, rf, event):
+    from pretix_payone.payment import PayoneCC
+
+    target = "https://secure.pay1.de/3ds/redirect.php?md=a+b&txid=1:2/3"
+    request = rf.get("/")
+    request.event = event
+    request.session = {
+        "iframe_session": True,
+        "payment_payone_order_secret": "s3cr3t",
+    }
+    url = urlparse(PayoneCC(event).redirect(request, target))
+    data = parse_qs(url.query)["data"][0]
+    assert signing.loads(data, salt="safe-redirect")["url"] == target
+
+    r = client.get(f"{url.path}?{url.query}")
+    assert r.status_code == 200
+    confirm_qs = parse_qs(urlparse(r.context["url"]).query)
+    assert confirm_qs["go"] == ["1"]
+    assert confirm_qs["data"] == [data]
+
+    r = client.get(f"{url.path}?{url.query}&go=1")
+    assert r.status_code == 302
+    assert r["Location"] == target
+    assert client.session["payment_payone_order_secret"] == "s3cr3t"
+
+
+@pytest.mark.django_db
+def test_redirect_invalid_signature(client, event):
+    r = client.get(
+        eventreverse(event, "plugins:pretix_payone:redirect") + "?data=foo&go=1"
+    )
+    assert r.status_code == 400